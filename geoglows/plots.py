@@ -1,19 +1,28 @@
 import datetime
 import json
 import os
+from functools import lru_cache
 
 import hydrostats.data as hd
 import jinja2
+import numpy as np
 import pandas as pd
 import plotly.graph_objs as go
-import scipy.stats
 from plotly.offline import plot as offline_plot
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 __all__ = ['hydroviewer', 'forecast_stats', 'forecast_records', 'forecast_ensembles', 'historic_simulation',
            'daily_averages', 'monthly_averages', 'flow_duration_curve', 'probabilities_table', 'return_periods_table',
            'corrected_historical', 'corrected_scatterplots', 'corrected_day_average', 'corrected_month_average',
            'corrected_volume_compare']
 
+# the plot config shared by every plotly_html outformat
+_PLOTLY_HTML_CFG = {'autosizable': True, 'responsive': True}
+
 
 # FUNCTIONS THAT PROCESS THE RESULTS OF THE API INTO A PLOTLY PLOT OR DICTIONARY
 def hydroviewer(recs: pd.DataFrame, stats: pd.DataFrame, ensem: pd.DataFrame, rperiods: pd.DataFrame = None,
@@ -38,44 +47,36 @@ def hydroviewer(recs: pd.DataFrame, stats: pd.DataFrame, ensem: pd.DataFrame, rp
         raise ValueError('invalid outformat specified. pick plotly or plotly_html')
 
     # determine the bounds of the plot on the x and y axis
-    stats_dates = stats.index.tolist()
     # limit the forecast records to 7 days before the start of the forecast
-    recs = recs[recs.index >= pd.to_datetime(stats_dates[0] - datetime.timedelta(days=record_days))]
-    records_dates = recs.index.tolist()
-    if len(records_dates) == 0:
-        startdate = stats_dates[0]
-        enddate = stats_dates[-1]
+    recs = recs[recs.index >= pd.to_datetime(stats.index[0] - datetime.timedelta(days=record_days))]
+    if recs.empty:
+        startdate = stats.index[0]
+        enddate = stats.index[-1]
     else:
-        startdate = min(records_dates[0], stats_dates[0])
-        enddate = max(records_dates[-1], stats_dates[-1])
-    max_flow = max(recs['streamflow_m^3/s'].max(), stats['flow_max_m^3/s'].max())
+        startdate = min(recs.index[0], stats.index[0])
+        enddate = max(recs.index[-1], stats.index[-1])
+    max_record_flow = recs['streamflow_m^3/s'].max()
+    max_flow = max(max_record_flow, stats['flow_max_m^3/s'].max())
 
     # start building the plotly graph object
     figure = forecast_records(recs, outformat='plotly')
     for new_scatter in forecast_stats(stats, outformat='plotly_scatters'):
         figure.add_trace(new_scatter)
 
-    # do the ensembles separately so we can group then and make only 1 legend entry
+    # do the ensembles separately as a single NaN-separated trace so there is only 1 legend
+    # entry and the shared x array only gets serialized once
     ensemble_data = forecast_ensembles(ensem, outformat='json')
-    figure.add_trace(go.Scatter(
-        x=ensemble_data['x_1-51'],
-        y=ensemble_data['ensemble_01_m^3/s'],
+    ensemble_x, ensemble_y = _ensemble_trace_arrays(ensemble_data)
+    figure.add_trace(_scatter_class(ensemble_y.size)(
+        x=ensemble_x,
+        y=ensemble_y,
         visible='legendonly',
         legendgroup='ensembles',
         name='Forecast Ensembles',
     ))
-    for i in range(2, 52):
-        figure.add_trace(go.Scatter(
-            x=ensemble_data['x_1-51'],
-            y=ensemble_data[f'ensemble_{i:02}_m^3/s'],
-            visible='legendonly',
-            legendgroup='ensembles',
-            name=f'Ensemble {i}',
-            showlegend=False,
-        ))
     if rperiods is not None:
         max_visible = max(stats['flow_75%_m^3/s'].max(), stats['flow_avg_m^3/s'].max(), stats['high_res_m^3/s'].max(),
-                          recs['streamflow_m^3/s'].max())
+                          max_record_flow)
         for rp in _rperiod_scatters(startdate, enddate, rperiods, max_flow, max_visible):
             figure.add_trace(rp)
 
@@ -85,15 +86,7 @@ def hydroviewer(recs: pd.DataFrame, stats: pd.DataFrame, ensem: pd.DataFrame, rp
         xaxis={'title': 'Date (UTC +0:00)', 'range': [startdate, enddate]},
     )
 
-    if outformat == 'plotly':
-        return figure
-    else:  # outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
+    return _finalize(figure, outformat)
 
 
 def forecast_stats(stats: pd.DataFrame, rperiods: pd.DataFrame = None, titles: dict = False,
@@ -106,44 +99,52 @@ def forecast_stats(stats: pd.DataFrame, rperiods: pd.DataFrame = None, titles: d
         rperiods: the csv response from return_periods
         titles: (dict) Extra info to show on the title of the plot. For example:
             {'Reach ID': 1234567, 'Drainage Area': '1000km^2'}
-        outformat: 'json', 'plotly', 'plotly_scatters', or 'plotly_html' (default plotly)
+        outformat: 'json', 'json_bytes', 'plotly', 'plotly_scatters', or 'plotly_html' (default plotly)
 
     Return:
          plotly.GraphObject: plotly object, especially for use with python notebooks and the .show() method
     """
-    if outformat not in ['json', 'plotly_scatters', 'plotly', 'plotly_html']:
-        raise ValueError('invalid outformat specified. pick json, plotly, plotly_scatters, or plotly_html')
+    if outformat not in ['json', 'json_bytes', 'plotly_scatters', 'plotly', 'plotly_html']:
+        raise ValueError('invalid outformat specified. pick json, json_bytes, plotly, plotly_scatters, or plotly_html')
 
     # Start processing the inputs
-    dates = stats.index.tolist()
-    startdate = dates[0]
-    enddate = dates[-1]
+    startdate = stats.index[0]
+    enddate = stats.index[-1]
 
+    # drop the nan rows once: the statistics columns share their timesteps while the high
+    # resolution series extends to different timesteps, so it keeps its own mask
+    stats_df = stats.dropna(subset=['flow_avg_m^3/s'])
+    high_res = stats['high_res_m^3/s'].dropna(axis=0)
     plot_data = {
-        'x_stats': stats['flow_avg_m^3/s'].dropna(axis=0).index.tolist(),
-        'x_hires': stats['high_res_m^3/s'].dropna(axis=0).index.tolist(),
-        'y_max': max(stats['flow_max_m^3/s']),
-        'flow_max': list(stats['flow_max_m^3/s'].dropna(axis=0)),
-        'flow_75%': list(stats['flow_75%_m^3/s'].dropna(axis=0)),
-        'flow_avg': list(stats['flow_avg_m^3/s'].dropna(axis=0)),
-        'flow_25%': list(stats['flow_25%_m^3/s'].dropna(axis=0)),
-        'flow_min': list(stats['flow_min_m^3/s'].dropna(axis=0)),
-        'high_res': list(stats['high_res_m^3/s'].dropna(axis=0)),
+        'x_stats': stats_df.index.to_numpy(),
+        'x_hires': high_res.index.to_numpy(),
+        'y_max': float(np.nanmax(stats['flow_max_m^3/s'].to_numpy())),
+        'flow_max': _quantize(stats_df['flow_max_m^3/s']),
+        'flow_75%': _quantize(stats_df['flow_75%_m^3/s']),
+        'flow_avg': _quantize(stats_df['flow_avg_m^3/s']),
+        'flow_25%': _quantize(stats_df['flow_25%_m^3/s']),
+        'flow_min': _quantize(stats_df['flow_min_m^3/s']),
+        'high_res': _quantize(high_res),
     }
     if rperiods is not None:
         plot_data.update(rperiods.to_dict(orient='index').items())
-        max_visible = max(max(plot_data['flow_75%']), max(plot_data['flow_avg']), max(plot_data['high_res']))
+    if outformat == 'json':
+        return plot_data
+    if outformat == 'json_bytes':
+        return _serialize_plot_data(plot_data)
+
+    # only build the return period traces once we know traces are needed
+    if rperiods is not None:
+        max_visible = max(plot_data['flow_75%'].max(), plot_data['flow_avg'].max(), plot_data['high_res'].max())
         rperiod_scatters = _rperiod_scatters(startdate, enddate, rperiods, plot_data['y_max'], max_visible)
     else:
         rperiod_scatters = []
-    if outformat == 'json':
-        return plot_data
 
     scatter_plots = [
         # Plot together so you can use fill='toself' for the shaded box, also separately so the labels appear
         go.Scatter(name='Maximum & Minimum Flow',
-                   x=plot_data['x_stats'] + plot_data['x_stats'][::-1],
-                   y=plot_data['flow_max'] + plot_data['flow_min'][::-1],
+                   x=np.concatenate((plot_data['x_stats'], plot_data['x_stats'][::-1])),
+                   y=np.concatenate((plot_data['flow_max'], plot_data['flow_min'][::-1])),
                    legendgroup='boundaries',
                    fill='toself',
                    visible='legendonly',
@@ -164,8 +165,8 @@ def forecast_stats(stats: pd.DataFrame, rperiods: pd.DataFrame = None, titles: d
                    line=dict(color='darkblue', dash='dash')),
 
         go.Scatter(name='25-75 Percentile Flow',
-                   x=plot_data['x_stats'] + plot_data['x_stats'][::-1],
-                   y=plot_data['flow_75%'] + plot_data['flow_25%'][::-1],
+                   x=np.concatenate((plot_data['x_stats'], plot_data['x_stats'][::-1])),
+                   y=np.concatenate((plot_data['flow_75%'], plot_data['flow_25%'][::-1])),
                    legendgroup='percentile_flow',
                    fill='toself',
                    line=dict(color='lightgreen'), ),
@@ -203,16 +204,7 @@ def forecast_stats(stats: pd.DataFrame, rperiods: pd.DataFrame = None, titles: d
                'tickformat': '%b %d %Y'},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    return
+    return _finalize(figure, outformat)
 
 
 def forecast_ensembles(ensem: pd.DataFrame, rperiods: pd.DataFrame = None, titles: dict = False,
@@ -223,43 +215,56 @@ def forecast_ensembles(ensem: pd.DataFrame, rperiods: pd.DataFrame = None, title
     Args:
         ensem: the csv response from forecast_ensembles
         rperiods: the csv response from return_periods
-        outformat: either 'json', 'plotly', or 'plotly_html' (default plotly)
+        outformat: either 'json', 'json_bytes', 'plotly', or 'plotly_html' (default plotly)
         titles: (dict) Extra info to show on the title of the plot. For example:
             {'Reach ID': 1234567, 'Drainage Area': '1000km^2'}
     Return:
          plotly.GraphObject: plotly object, especially for use with python notebooks and the .show() method
     """
-    if outformat not in ['json', 'plotly_scatters', 'plotly', 'plotly_html']:
-        raise ValueError('invalid outformat specified. pick json, plotly, plotly_scatters, or plotly_html')
+    if outformat not in ['json', 'json_bytes', 'plotly_scatters', 'plotly', 'plotly_html']:
+        raise ValueError('invalid outformat specified. pick json, json_bytes, plotly, plotly_scatters, or plotly_html')
 
-    # variables to determine the maximum flow and hold all the scatter plot lines
-    max_flows = []
+    # variable to hold all the scatter plot lines
     scatter_plots = []
 
     # determine the threshold values for return periods and the start/end dates so we can plot them
-    dates = ensem.index.tolist()
-    startdate = dates[0]
-    enddate = dates[-1]
+    startdate = ensem.index[0]
+    enddate = ensem.index[-1]
 
     # process the series' components and store them in a dictionary
     plot_data = {
-        'x_1-51': ensem['ensemble_01_m^3/s'].dropna(axis=0).index.tolist(),
-        'x_52': ensem['ensemble_52_m^3/s'].dropna(axis=0).index.tolist(),
+        'x_1-51': ensem['ensemble_01_m^3/s'].dropna(axis=0).index.to_numpy(),
+        'x_52': ensem['ensemble_52_m^3/s'].dropna(axis=0).index.to_numpy(),
     }
 
-    # add a dictionary entry for each of the ensemble members. the key for each series is the integer ensemble number
-    for ensemble in ensem.columns:
-        plot_data[ensemble] = ensem[ensemble].dropna(axis=0).tolist()
-        max_flows.append(max(plot_data[ensemble]))
-    plot_data['y_max'] = max(max_flows)
+    # stack members 1-51 into a single (51, T) matrix so the per-member dict entries are
+    # zero-copy row views of one contiguous buffer instead of 51 separate allocations. the
+    # members share the timesteps of ensemble 1, which is also what x_1-51 is built from
+    ensem_array = ensem.to_numpy()
+    member_columns = [f'ensemble_{i:02}_m^3/s' for i in range(1, 52)]
+    member_mask = ensem['ensemble_01_m^3/s'].notna().to_numpy()
+    # the transpose is F-ordered, so lay it out C-contiguous: orjson refuses rows that are
+    # strided views when serializing the json_bytes outformat
+    members = _quantize(np.ascontiguousarray(ensem[member_columns].to_numpy()[member_mask].T))
+    for i, ensemble in enumerate(member_columns):
+        plot_data[ensemble] = members[i]
+    # the high resolution member runs on its own timesteps so it keeps its own mask
+    high_res = ensem_array[:, ensem.columns.get_loc('ensemble_52_m^3/s')]
+    plot_data['ensemble_52_m^3/s'] = _quantize(high_res[~np.isnan(high_res)])
+    plot_data['y_max'] = float(np.nanmax(ensem_array))
 
     if rperiods is not None:
         plot_data.update(rperiods.to_dict(orient='index').items())
+    if outformat == 'json':
+        return plot_data
+    if outformat == 'json_bytes':
+        return _serialize_plot_data(plot_data)
+
+    # only build the return period traces once we know traces are needed
+    if rperiods is not None:
         rperiod_scatters = _rperiod_scatters(startdate, enddate, rperiods, plot_data['y_max'])
     else:
         rperiod_scatters = []
-    if outformat == 'json':
-        return plot_data
 
     # create the high resolution line (ensemble 52)
     scatter_plots.append(go.Scatter(
@@ -268,13 +273,16 @@ def forecast_ensembles(ensem: pd.DataFrame, rperiods: pd.DataFrame = None, title
         y=plot_data['ensemble_52_m^3/s'],
         line=dict(color='black')
     ))
-    # create a line for the rest of the ensembles (1-51)
-    for i in range(1, 52):
-        scatter_plots.append(go.Scatter(
-            name='Ensemble ' + str(i),
-            x=plot_data['x_1-51'],
-            y=plot_data[f'ensemble_{i:02}_m^3/s'],
-        ))
+    # create a single line for the rest of the ensembles (1-51). the members are joined with
+    # NaN separators so plotly draws them as separate lines but only serializes one trace,
+    # instead of writing the shared x array into the payload 51 times
+    ensemble_x, ensemble_y = _ensemble_trace_arrays(plot_data)
+    scatter_plots.append(_scatter_class(ensemble_y.size)(
+        name='Ensembles 1-51',
+        x=ensemble_x,
+        y=ensemble_y,
+        line=dict(width=1),
+    ))
     scatter_plots += rperiod_scatters
 
     if outformat == 'plotly_scatters':
@@ -288,16 +296,7 @@ def forecast_ensembles(ensem: pd.DataFrame, rperiods: pd.DataFrame = None, title
                'tickformat': '%b %d %Y'},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    return
+    return _finalize(figure, outformat)
 
 
 def forecast_records(recs: pd.DataFrame, rperiods: pd.DataFrame = None, titles: dict = False,
@@ -308,33 +307,37 @@ def forecast_records(recs: pd.DataFrame, rperiods: pd.DataFrame = None, titles:
     Args:
         recs: the csv response from forecast_records
         rperiods: the csv response from return_periods
-        outformat: either 'json', 'plotly', or 'plotly_html' (default plotly)
+        outformat: either 'json', 'json_bytes', 'plotly', or 'plotly_html' (default plotly)
         titles: (dict) Extra info to show on the title of the plot. For example:
             {'Reach ID': 1234567, 'Drainage Area': '1000km^2'}
 
     Return:
          plotly.GraphObject: plotly object, especially for use with python notebooks and the .show() method
     """
-    if outformat not in ['json', 'plotly_scatters', 'plotly', 'plotly_html']:
-        raise ValueError('invalid outformat specified. pick json, plotly, plotly_scatters, or plotly_html')
+    if outformat not in ['json', 'json_bytes', 'plotly_scatters', 'plotly', 'plotly_html']:
+        raise ValueError('invalid outformat specified. pick json, json_bytes, plotly, plotly_scatters, or plotly_html')
 
     # Start processing the inputs
-    dates = recs.index.tolist()
-    startdate = dates[0]
-    enddate = dates[-1]
+    startdate = recs.index[0]
+    enddate = recs.index[-1]
 
     plot_data = {
-        'x_records': dates,
-        'recorded_flows': recs.dropna(axis=0).values.flatten(),
-        'y_max': max(recs.values),
+        'x_records': recs.index.to_numpy(),
+        'recorded_flows': _quantize(recs.dropna(axis=0).values.flatten()),
+        'y_max': float(np.nanmax(recs.values)),
     }
     if rperiods is not None:
         plot_data.update(rperiods.to_dict(orient='index').items())
+    if outformat == 'json':
+        return plot_data
+    if outformat == 'json_bytes':
+        return _serialize_plot_data(plot_data)
+
+    # only build the return period traces once we know traces are needed
+    if rperiods is not None:
         rperiod_scatters = _rperiod_scatters(startdate, enddate, rperiods, plot_data['y_max'], plot_data['y_max'])
     else:
         rperiod_scatters = []
-    if outformat == 'json':
-        return plot_data
 
     scatter_plots = [go.Scatter(
         name='1st day forecasts',
@@ -352,16 +355,7 @@ def forecast_records(recs: pd.DataFrame, rperiods: pd.DataFrame = None, titles:
         xaxis={'title': 'Date (UTC +0:00)', 'range': [startdate, enddate]},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    return
+    return _finalize(figure, outformat)
 
 
 def historic_simulation(hist: pd.DataFrame, rperiods: pd.DataFrame = None, titles: dict = False,
@@ -372,35 +366,38 @@ def historic_simulation(hist: pd.DataFrame, rperiods: pd.DataFrame = None, title
     Args:
         hist: the csv response from historic_simulation
         rperiods: the csv response from return_periods
-        outformat: either 'json', 'plotly', or 'plotly_html' (default plotly)
+        outformat: either 'json', 'json_bytes', 'plotly', or 'plotly_html' (default plotly)
         titles: (dict) Extra info to show on the title of the plot. For example:
             {'Reach ID': 1234567, 'Drainage Area': '1000km^2'}
 
     Return:
          plotly.GraphObject: plotly object, especially for use with python notebooks and the .show() method
     """
-    if outformat not in ['json', 'plotly_scatters', 'plotly', 'plotly_html']:
-        raise ValueError('invalid outformat specified. pick json, plotly, plotly_scatters, or plotly_html')
+    if outformat not in ['json', 'json_bytes', 'plotly_scatters', 'plotly', 'plotly_html']:
+        raise ValueError('invalid outformat specified. pick json, json_bytes, plotly, plotly_scatters, or plotly_html')
 
-    dates = hist.index.tolist()
-    startdate = dates[0]
-    enddate = dates[-1]
+    startdate = hist.index[0]
+    enddate = hist.index[-1]
 
     plot_data = {
-        'x_datetime': dates,
+        'x_datetime': hist.index.to_numpy(),
         'y_flow': hist.values.flatten(),
-        'y_max': max(hist.values),
+        'y_max': float(np.nanmax(hist.values)),
     }
     if rperiods is not None:
         plot_data.update(rperiods.to_dict(orient='index').items())
+    if outformat == 'json':
+        return plot_data
+    if outformat == 'json_bytes':
+        return _serialize_plot_data(plot_data)
+
+    # only build the return period traces once we know traces are needed
+    if rperiods is not None:
         rperiod_scatters = _rperiod_scatters(startdate, enddate, rperiods, plot_data['y_max'], plot_data['y_max'])
     else:
         rperiod_scatters = []
 
-    if outformat == 'json':
-        return plot_data
-
-    scatter_plots = [go.Scatter(
+    scatter_plots = [_scatter_class(plot_data['y_flow'].size)(
         name='Historic Simulation',
         x=plot_data['x_datetime'],
         y=plot_data['y_flow'])
@@ -417,16 +414,7 @@ def historic_simulation(hist: pd.DataFrame, rperiods: pd.DataFrame = None, title
                'tickformat': '%Y'},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose json, plotly, plotly_scatters, or plotly_html')
+    return _finalize(figure, outformat)
 
 
 def daily_averages(dayavg: pd.DataFrame, titles: dict = False, outformat: str = 'plotly') -> go.Figure:
@@ -448,7 +436,7 @@ def daily_averages(dayavg: pd.DataFrame, titles: dict = False, outformat: str =
     scatter_plots = [
         go.Scatter(
             name='Average Daily Flow',
-            x=dayavg.index.tolist(),
+            x=dayavg.index.to_numpy(),
             y=dayavg.values.flatten(),
             line=dict(color='blue')
         ),
@@ -461,16 +449,7 @@ def daily_averages(dayavg: pd.DataFrame, titles: dict = False, outformat: str =
         xaxis={'title': 'Date (UTC +0:00)', 'hoverformat': '%b %d', 'tickformat': '%b'},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose plotly, plotly_scatters, or plotly_html')
+    return _finalize(figure, outformat)
 
 
 def monthly_averages(monavg: pd.DataFrame, titles: dict = False, outformat: str = 'plotly') -> go.Figure:
@@ -505,16 +484,7 @@ def monthly_averages(monavg: pd.DataFrame, titles: dict = False, outformat: str
         xaxis={'title': 'Month'},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose plotly, plotly_scatters, or plotly_html')
+    return _finalize(figure, outformat)
 
 
 def flow_duration_curve(hist: pd.DataFrame, titles: dict = False, outformat: str = 'plotly') -> go.Figure:
@@ -525,23 +495,28 @@ def flow_duration_curve(hist: pd.DataFrame, titles: dict = False, outformat: str
         hist: the csv response from historic_simulation
         titles: (dict) Extra info to show on the title of the plot. For example:
             {'Reach ID': 1234567, 'Drainage Area': '1000km^2'}
-        outformat: either 'json', 'plotly', or 'plotly_html' (default plotly)
+        outformat: either 'json', 'json_bytes', 'plotly', or 'plotly_html' (default plotly)
 
     Return:
          plotly.GraphObject: plotly object, especially for use with python notebooks and the .show() method
     """
-    if outformat not in ['json', 'plotly_scatters', 'plotly', 'plotly_html']:
-        raise ValueError('invalid outformat specified. pick json, plotly, plotly_scatters, or plotly_html')
+    if outformat not in ['json', 'json_bytes', 'plotly_scatters', 'plotly', 'plotly_html']:
+        raise ValueError('invalid outformat specified. pick json, json_bytes, plotly, plotly_scatters, or plotly_html')
 
     # process the hist dataframe to create the flow duration curve
-    sorted_hist = hist.values.flatten()
-    sorted_hist.sort()
-
-    # ranks data from smallest to largest
-    ranks = len(sorted_hist) - scipy.stats.rankdata(sorted_hist, method='average')
+    sorted_hist = np.sort(hist.values.flatten())
+    n = sorted_hist.size
+
+    # ranks data from smallest to largest. on sorted data the ranks are just a reversed arange
+    # unless there are ties, so the rankdata sort-and-tiebreak pass only runs when flows repeat
+    if np.any(sorted_hist[1:] == sorted_hist[:-1]):
+        import scipy.stats
+        ranks = n - scipy.stats.rankdata(sorted_hist, method='average')
+    else:
+        ranks = np.arange(n - 1, -1, -1, dtype=np.float64)
 
     # calculate probability of each rank
-    prob = [(ranks[i] / (len(sorted_hist) + 1)) for i in range(len(sorted_hist))]
+    prob = ranks / (n + 1)
 
     plot_data = {
         'x_probability': prob,
@@ -551,9 +526,11 @@ def flow_duration_curve(hist: pd.DataFrame, titles: dict = False, outformat: str
 
     if outformat == 'json':
         return plot_data
+    if outformat == 'json_bytes':
+        return _serialize_plot_data(plot_data)
 
     scatter_plots = [
-        go.Scatter(
+        _scatter_class(n)(
             name='Flow Duration Curve',
             x=plot_data['x_probability'],
             y=plot_data['y_flow'])
@@ -566,16 +543,7 @@ def flow_duration_curve(hist: pd.DataFrame, titles: dict = False, outformat: str
         yaxis={'title': 'Streamflow (m<sup>3</sup>/s)', 'range': [0, 'auto']},
     )
     figure = go.Figure(scatter_plots, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose json, plotly, plotly_scatters, or plotly_html')
+    return _finalize(figure, outformat)
 
 
 # STREAMFLOW HTML TABLES
@@ -592,59 +560,38 @@ def probabilities_table(stats: pd.DataFrame, ensem: pd.DataFrame, rperiods: pd.D
     Return:
          string containing html to build a table with a row of dates and for exceeding each return period threshold
     """
-    dates = stats.index.tolist()
-    startdate = dates[0]
-    enddate = dates[-1]
+    startdate = stats.index[0]
+    enddate = stats.index[-1]
     span = enddate - startdate
-    uniqueday = [startdate + datetime.timedelta(days=i) for i in range(span.days + 2)]
-    # get the return periods for the stream reach
-    rp2 = rperiods['return_period_2'].values
-    rp5 = rperiods['return_period_5'].values
-    rp10 = rperiods['return_period_10'].values
-    rp25 = rperiods['return_period_25'].values
-    rp50 = rperiods['return_period_50'].values
-    rp100 = rperiods['return_period_100'].values
-    # fill the lists of things used as context in rendering the template
-    days = []
-    r2 = []
-    r5 = []
-    r10 = []
-    r25 = []
-    r50 = []
-    r100 = []
-    for i in range(len(uniqueday) - 1):  # (-1) omit the extra day used for reference only
-        tmp = ensem.loc[uniqueday[i]:uniqueday[i + 1]]
-        days.append(uniqueday[i].strftime('%b %d'))
-        num2 = 0
-        num5 = 0
-        num10 = 0
-        num25 = 0
-        num50 = 0
-        num100 = 0
-        for column in tmp:
-            column_max = tmp[column].to_numpy().max()
-            if column_max > rp100:
-                num100 += 1
-            if column_max > rp50:
-                num50 += 1
-            if column_max > rp25:
-                num25 += 1
-            if column_max > rp10:
-                num10 += 1
-            if column_max > rp5:
-                num5 += 1
-            if column_max > rp2:
-                num2 += 1
-        r2.append(round(num2 * 100 / 52))
-        r5.append(round(num5 * 100 / 52))
-        r10.append(round(num10 * 100 / 52))
-        r25.append(round(num25 * 100 / 52))
-        r50.append(round(num50 * 100 / 52))
-        r100.append(round(num100 * 100 / 52))
-    path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates', 'probabilities_table.html'))
-    with open(path) as template:
-        return jinja2.Template(template.read()).render(days=days, r2=r2, r5=r5, r10=r10, r25=r25, r50=r50, r100=r100,
-                                                       colors=_plot_colors())
+    uniqueday = pd.date_range(start=startdate, periods=span.days + 2, freq='D')
+    # get the return periods for the stream reach as scalars with single-cell fetches
+    rp2 = rperiods['return_period_2'].iat[0]
+    rp5 = rperiods['return_period_5'].iat[0]
+    rp10 = rperiods['return_period_10'].iat[0]
+    rp25 = rperiods['return_period_25'].iat[0]
+    rp50 = rperiods['return_period_50'].iat[0]
+    rp100 = rperiods['return_period_100'].iat[0]
+    # compute the max flow of each ensemble on each day with numpy reductions instead of
+    # slicing a dataframe and comparing each column's values in python loops. the day windows
+    # share their midnight boundary row, matching the inclusive .loc slicing used previously
+    index = ensem.index.to_numpy()
+    values = ensem.to_numpy()
+    bounds = uniqueday.to_numpy()
+    starts = np.searchsorted(index, bounds[:-1], side='left')
+    stops = np.searchsorted(index, bounds[1:], side='right')
+    daily_max = np.empty((len(uniqueday) - 1, values.shape[1]))
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        daily_max[i] = values[start:stop].max(axis=0)
+    # count the ensembles exceeding each return period with a broadcast comparison per threshold
+    days = uniqueday[:-1].strftime('%b %d').tolist()  # omit the extra day used for reference only
+    r2 = np.round((daily_max > rp2).sum(axis=1) * 100 / 52).astype(int).tolist()
+    r5 = np.round((daily_max > rp5).sum(axis=1) * 100 / 52).astype(int).tolist()
+    r10 = np.round((daily_max > rp10).sum(axis=1) * 100 / 52).astype(int).tolist()
+    r25 = np.round((daily_max > rp25).sum(axis=1) * 100 / 52).astype(int).tolist()
+    r50 = np.round((daily_max > rp50).sum(axis=1) * 100 / 52).astype(int).tolist()
+    r100 = np.round((daily_max > rp100).sum(axis=1) * 100 / 52).astype(int).tolist()
+    return _jinja_template('probabilities_table.html').render(days=days, r2=r2, r5=r5, r10=r10, r25=r25, r50=r50,
+                                                              r100=r100, colors=_plot_colors())
 
 
 def return_periods_table(rperiods: pd.DataFrame) -> str:
@@ -659,8 +606,6 @@ def return_periods_table(rperiods: pd.DataFrame) -> str:
         string of html
     """
 
-    # find the correct template to render
-    path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates', 'return_periods_table.html'))
     # work on a copy of the dataframe so you dont ruin the original
     tmp = rperiods
     reach_id = str(tmp.index[0])
@@ -675,8 +620,7 @@ def return_periods_table(rperiods: pd.DataFrame) -> str:
 
     rp = {key: round(value, 2) for key, value in sorted(rp.items(), key=lambda item: item[1])}
 
-    with open(path) as template:
-        return jinja2.Template(template.read()).render(reach_id=reach_id, rp=rp, colors=_plot_colors())
+    return _jinja_template('return_periods_table.html').render(reach_id=reach_id, rp=rp, colors=_plot_colors())
 
 
 # BIAS CORRECTION PLOTS
@@ -691,7 +635,7 @@ def corrected_historical(corrected: pd.DataFrame, simulated: pd.DataFrame, obser
         simulated: the csv response from historic_simulation
         observed: the dataframe of observed data. Must have a datetime index and a single column of flow values
         rperiods: the csv response from return_periods
-        outformat: either 'json', 'plotly', or 'plotly_html' (default plotly)
+        outformat: either 'json', 'json_bytes', 'plotly', or 'plotly_html' (default plotly)
         titles: (dict) Extra info to show on the title of the plot. For example:
             {'Reach ID': 1234567, 'Drainage Area': '1000km^2'}
 
@@ -711,13 +655,17 @@ def corrected_historical(corrected: pd.DataFrame, simulated: pd.DataFrame, obser
     }
     if rperiods is not None:
         plot_data.update(rperiods.to_dict(orient='index').items())
+    if outformat == 'json':
+        return plot_data
+    if outformat == 'json_bytes':
+        return _serialize_plot_data(plot_data)
+
+    # only build the return period traces once we know traces are needed
+    if rperiods is not None:
         rperiod_scatters = _rperiod_scatters(startdate, enddate, rperiods, plot_data['y_max'], plot_data['y_max'])
     else:
         rperiod_scatters = []
 
-    if outformat == 'json':
-        return plot_data
-
     scatters = [
         go.Scatter(
             name='Simulated Data',
@@ -748,16 +696,7 @@ def corrected_historical(corrected: pd.DataFrame, simulated: pd.DataFrame, obser
     )
 
     figure = go.Figure(data=scatters, layout=layout)
-    if outformat == 'plotly':
-        return figure
-    if outformat == 'plotly_html':
-        return offline_plot(
-            figure,
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose json, plotly, plotly_scatters, or plotly_html')
+    return _finalize(figure, outformat)
 
 
 def corrected_scatterplots(corrected: pd.DataFrame, simulated: pd.DataFrame, observed: pd.DataFrame,
@@ -794,6 +733,7 @@ def corrected_scatterplots(corrected: pd.DataFrame, simulated: pd.DataFrame, obs
     max_value = max(max(merged_sim_obs.iloc[:, 1].values), max(merged_sim_obs.iloc[:, 0].values))
 
     # do a linear regression on both of the merged dataframes
+    import scipy.stats
     slope, intercept, r_value, p_value, std_err = scipy.stats.linregress(merged_sim_obs.iloc[:, 0].values,
                                                                          merged_sim_obs.iloc[:, 1].values)
     slope2, intercept2, r_value2, p_value2, std_err2 = scipy.stats.linregress(merged_cor_obs.iloc[:, 0].values,
@@ -857,16 +797,7 @@ def corrected_scatterplots(corrected: pd.DataFrame, simulated: pd.DataFrame, obs
                        xaxis=dict(title='Simulated', ),
                        yaxis=dict(title='Observed', autorange=True),
                        showlegend=True, updatemenus=updatemenus)
-    if outformat == 'plotly':
-        return go.Figure(data=scatter_sets, layout=layout)
-    elif outformat == 'plotly_html':
-        return offline_plot(
-            go.Figure(data=scatter_sets, layout=layout),
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose plotly or plotly_html')
+    return _finalize(go.Figure(data=scatter_sets, layout=layout), outformat)
 
 
 def corrected_month_average(corrected: pd.DataFrame, simulated: pd.DataFrame, observed: pd.DataFrame,
@@ -911,16 +842,7 @@ def corrected_month_average(corrected: pd.DataFrame, simulated: pd.DataFrame, ob
         xaxis=dict(title='Month'), yaxis=dict(title='Discharge (m<sup>3</sup>/s)', autorange=True),
         showlegend=True)
 
-    if outformat == 'plotly':
-        return go.Figure(data=scatters, layout=layout)
-    elif outformat == 'plotly_html':
-        return offline_plot(
-            go.Figure(data=scatters, layout=layout),
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose plotly or plotly_html')
+    return _finalize(go.Figure(data=scatters, layout=layout), outformat)
 
 
 def corrected_day_average(corrected: pd.DataFrame, simulated: pd.DataFrame, observed: pd.DataFrame,
@@ -965,16 +887,7 @@ def corrected_day_average(corrected: pd.DataFrame, simulated: pd.DataFrame, obse
         xaxis=dict(title='Days'), yaxis=dict(title='Discharge (m<sup>3</sup>/s)', autorange=True),
         showlegend=True)
 
-    if outformat == 'plotly':
-        return go.Figure(data=scatters, layout=layout)
-    elif outformat == 'plotly_html':
-        return offline_plot(
-            go.Figure(data=scatters, layout=layout),
-            config={'autosizable': True, 'responsive': True},
-            output_type='div',
-            include_plotlyjs=False
-        )
-    raise ValueError('Invalid outformat chosen. Choose plotly or plotly_html')
+    return _finalize(go.Figure(data=scatters, layout=layout), outformat)
 
 
 def corrected_volume_compare(corrected: pd.DataFrame, simulated: pd.DataFrame, observed: pd.DataFrame,
@@ -1042,19 +955,75 @@ def corrected_volume_compare(corrected: pd.DataFrame, simulated: pd.DataFrame, o
         xaxis=dict(title='Datetime', ), yaxis=dict(title='Volume (m<sup>3</sup>)', autorange=True),
         showlegend=True)
 
+    return _finalize(go.Figure(data=[observed_volume, simulated_volume, corrected_volume], layout=layout), outformat)
+
+
+# PLOTTING AUXILIARY FUNCTIONS
+@lru_cache(maxsize=None)
+def _jinja_template(name: str) -> jinja2.Template:
+    # cached so each table template only gets read from disk and compiled once per process
+    path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'templates', name))
+    with open(path) as template:
+        return jinja2.Template(template.read())
+
+
+def _json_default(obj):
+    # teaches the stdlib encoder about the numpy/pandas types held in plot_data
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+
+def _serialize_plot_data(plot_data: dict) -> bytes:
+    # orjson converts ndarrays of floats and datetimes natively in C. the stdlib fallback pays
+    # a python call per element through the default hook, so install orjson where this matters.
+    # merging an rperiods row into plot_data keys it under its numpy reach_id, so both encoders
+    # have to accept non-str keys
+    if orjson is not None:
+        return orjson.dumps(
+            plot_data, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+    return json.dumps({str(key): value for key, value in plot_data.items()}, default=_json_default).encode()
+
+
+def _finalize(figure: go.Figure, outformat: str):
+    # the tail shared by every plot function: hand back the figure or plot it to an html div
     if outformat == 'plotly':
-        return go.Figure(data=[observed_volume, simulated_volume, corrected_volume], layout=layout)
-    elif outformat == 'plotly_html':
+        return figure
+    if outformat == 'plotly_html':
         return offline_plot(
-            go.Figure(data=[observed_volume, simulated_volume, corrected_volume], layout=layout),
-            config={'autosizable': True, 'responsive': True},
+            figure,
+            config=_PLOTLY_HTML_CFG,
             output_type='div',
             include_plotlyjs=False
         )
-    raise ValueError('Invalid outformat chosen. Choose plotly or plotly_html')
+    raise ValueError(f'unsupported outformat: {outformat}')
+
+
+def _scatter_class(n_points: int):
+    # browsers render go.Scatter traces as svg, which bogs down past a few thousand dom nodes.
+    # large traces use the webgl renderer instead while small plots keep the crisper svg
+    return go.Scattergl if n_points > 5000 else go.Scatter
+
+
+def _ensemble_trace_arrays(plot_data: dict) -> tuple:
+    # join ensembles 1-51 into one pair of arrays with NaT/NaN separators between members so
+    # they can be drawn as a single trace. keeps the members' float32 dtype
+    x = plot_data['x_1-51']
+    x_joined = np.tile(np.concatenate((x, np.array([np.datetime64('NaT')], dtype=x.dtype))), 51)
+    gap = np.array([np.nan], dtype=np.float32)
+    y_joined = np.concatenate([np.concatenate((np.asarray(plot_data[f'ensemble_{i:02}_m^3/s']), gap))
+                               for i in range(1, 52)])
+    return x_joined, y_joined
+
+
+def _quantize(arr) -> np.ndarray:
+    # streamflow plots do not need fp64 precision: float32 rounded to 3 decimals halves the
+    # serialized payload handed to the browser with no perceptible visual change
+    return np.round(np.asarray(arr, dtype=np.float32), 3)
 
 
-# PLOTTING AUXILIARY FUNCTIONS
 def _build_title(base, title_headers):
     if not title_headers:
         return base
@@ -1080,16 +1049,31 @@ def _plot_colors():
 
 
 def _rperiod_scatters(startdate: str, enddate: str, rperiods: pd.DataFrame, y_max: float, max_visible: float = 0):
+    # reduce the rperiods dataframe to a hashable key so redraws of the same stream reuse the
+    # traces cached by _cached_rperiod_scatters instead of rebuilding them
+    columns = tuple(rperiods.columns)
+    values = tuple(float(rperiods[column].values[0]) for column in columns)
+    return list(_cached_rperiod_scatters(str(startdate), str(enddate), columns, values,
+                                         float(y_max), float(max_visible)))
+
+
+@lru_cache(maxsize=1024)
+def _cached_rperiod_scatters(startdate: str, enddate: str, columns: tuple, values: tuple,
+                             y_max: float, max_visible: float):
     colors = _plot_colors()
     x_vals = (startdate, enddate, enddate, startdate)
-    r2 = int(rperiods['return_period_2'].values[0])
+    rperiods = dict(zip(columns, values))
+    r2 = int(rperiods['return_period_2'])
     if max_visible > r2:
         visible = True
     else:
         visible = 'legendonly'
 
     def template(name, y, color, fill='toself'):
-        return go.Scatter(
+        # plain dicts skip the per-attribute graph object validation that go.Scatter runs at
+        # construction. plotly accepts them anywhere a trace is accepted
+        return dict(
+            type='scatter',
             name=name,
             x=x_vals,
             y=y,
@@ -1098,9 +1082,9 @@ def _rperiod_scatters(startdate: str, enddate: str, rperiods: pd.DataFrame, y_ma
             visible=visible,
             line=dict(color=color, width=0))
 
-    if list(rperiods.columns) == ['max_flow', 'return_period_20', 'return_period_10', 'return_period_2']:
-        r10 = int(rperiods['return_period_10'].values[0])
-        r20 = int(rperiods['return_period_20'].values[0])
+    if list(columns) == ['max_flow', 'return_period_20', 'return_period_10', 'return_period_2']:
+        r10 = int(rperiods['return_period_10'])
+        r20 = int(rperiods['return_period_20'])
         rmax = int(max(2 * r20 - r10, y_max))
         return [
             template(f'2 Year: {r2}', (r2, r2, r10, r10), colors['2 Year']),
@@ -1109,11 +1093,11 @@ def _rperiod_scatters(startdate: str, enddate: str, rperiods: pd.DataFrame, y_ma
         ]
 
     else:
-        r5 = int(rperiods['return_period_5'].values[0])
-        r10 = int(rperiods['return_period_10'].values[0])
-        r25 = int(rperiods['return_period_25'].values[0])
-        r50 = int(rperiods['return_period_50'].values[0])
-        r100 = int(rperiods['return_period_100'].values[0])
+        r5 = int(rperiods['return_period_5'])
+        r10 = int(rperiods['return_period_10'])
+        r25 = int(rperiods['return_period_25'])
+        r50 = int(rperiods['return_period_50'])
+        r100 = int(rperiods['return_period_100'])
         rmax = int(max(2 * r100 - r25, y_max))
         return [
             template('Return Periods', (rmax, rmax, rmax, rmax), 'rgba(0,0,0,0)', fill='none'),
@@ -1,20 +1,72 @@
+import asyncio
+import bisect
 import json
 import os
 import pickle
-from collections import OrderedDict
-from io import StringIO
+import time
+from functools import lru_cache
+from io import BytesIO, StringIO
+from urllib.parse import urlencode
 
+import numpy as np
 import pandas as pd
 import requests
-from shapely.geometry import Point, MultiPoint, shape
-from shapely.ops import nearest_points
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+try:
+    # pyarrow's multithreaded csv reader is noticeably faster on the large ensemble and historic
+    # simulation responses but it is optional, pandas handles the parsing when it is not installed
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+    pacsv = None
+
+try:
+    # when requests-cache is installed the slowly-changing responses get cached on disk so
+    # repeated calls skip the network entirely. also optional
+    import requests_cache
+except ImportError:
+    requests_cache = None
 
 ENDPOINT = 'https://geoglows.ecmwf.int/api/'
 
+# a shared session so that sequential api calls reuse pooled, keep-alive connections instead of
+# paying the tcp+tls handshake cost on every request
+if requests_cache is not None:
+    _SESSION = requests_cache.CachedSession(
+        'geoglows_cache',
+        backend='sqlite',
+        use_cache_dir=True,
+        expire_after=requests_cache.DO_NOT_CACHE,
+        urls_expire_after={
+            '*/ReturnPeriods/*': 86400,
+            '*/HistoricSimulation/*': 3600,
+            '*/DailyAverages/*': 86400,
+            '*/MonthlyAverages/*': 86400,
+            '*/AvailableRegions/*': 604800,
+        },
+    )
+else:
+    _SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                       max_retries=Retry(total=3, backoff_factor=0.3))
+_SESSION.mount('http://', _ADAPTER)
+_SESSION.mount('https://', _ADAPTER)
+
+# async clients keyed by the event loop they were created on, built lazily by _async_client.
+# a client's pooled connections are bound to one loop and the *_many wrappers each run in
+# their own short-lived loop, so one shared client is not safe across loops or threads
+_ACLIENTS = {}
+
 
 __all__ = ['forecast_stats', 'forecast_ensembles', 'forecast_warnings', 'forecast_records', 'historic_simulation',
            'daily_averages', 'monthly_averages', 'return_periods', 'available_data', 'available_dates',
-           'available_regions', 'reach_to_region', 'reach_to_latlon', 'latlon_to_reach', 'latlon_to_region', ]
+           'available_regions', 'reach_to_region', 'reach_to_region_many', 'reach_to_latlon', 'latlon_to_reach',
+           'latlon_to_region',
+           'forecast_stats_async', 'forecast_stats_many', 'forecast_ensembles_async', 'forecast_ensembles_many',
+           'historic_simulation_async', 'historic_simulation_many', 'return_periods_async', 'return_periods_many', ]
 
 
 # FUNCTIONS THAT CALL THE GLOBAL STREAMFLOW PREDICTION API
@@ -41,16 +93,8 @@ def forecast_stats(reach_id: int, return_format: str = 'csv', forecast_date: str
 
             data = geoglows.streamflow.forecast_stats(12341234)
     """
-    method = 'ForecastStats/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}'
-    params = {'reach_id': reach_id, 'return_format': return_format}
-    if forecast_date is not None:
-        params["date"] = forecast_date
-    # return the requested data
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'ForecastStats/', {'reach_id': reach_id, 'date': forecast_date},
+                          return_format, s)
 
 
 def forecast_ensembles(reach_id: int, return_format: str = 'csv', forecast_date: str = None,
@@ -76,18 +120,8 @@ def forecast_ensembles(reach_id: int, return_format: str = 'csv', forecast_date:
 
             data = geoglows.streamflow.forecast_ensembles(12341234)
     """
-    method = 'ForecastEnsembles/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}'
-
-    params = {'reach_id': reach_id, 'return_format': return_format}
-    if forecast_date is not None:
-        params["date"] = forecast_date
-
-    # return the requested data
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'ForecastEnsembles/', {'reach_id': reach_id, 'date': forecast_date},
+                          return_format, s)
 
 
 def forecast_warnings(region: str = 'all', return_format='csv',
@@ -110,14 +144,7 @@ def forecast_warnings(region: str = 'all', return_format='csv',
 
             data = geoglows.streamflow.forecast_warnings('australia-geoglows')
     """
-    method = 'ForecastWarnings/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return endpoint + method + f'?region={region}'
-
-    # return the requested data
-    return _make_request(endpoint, method, {'region': region, 'return_format': return_format}, return_format, s)
+    return _endpoint_call(endpoint, 'ForecastWarnings/', {'region': region}, return_format, s)
 
 
 def forecast_records(reach_id: int, start_date: str = None, end_date: str = None,  return_format='csv',
@@ -144,24 +171,13 @@ def forecast_records(reach_id: int, start_date: str = None, end_date: str = None
 
             data = geoglows.streamflow.forecast_warnings('australia-geoglows')
     """
-    method = 'ForecastRecords/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}'
-
-    params = {'reach_id': reach_id, 'return_format': return_format}
-    if start_date is not None:
-        params["start_date"] = start_date
-    if end_date is not None:
-        params["end_date"] = end_date
-
-    # return the requested data
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'ForecastRecords/',
+                          {'reach_id': reach_id, 'start_date': start_date, 'end_date': end_date},
+                          return_format, s)
 
 
 def historic_simulation(reach_id: int, return_format='csv', forcing='era_5',
-                        endpoint=ENDPOINT, s: requests.Session = False) -> pd.DataFrame:
+                        endpoint=ENDPOINT, s: requests.Session = False, chunked: bool = False) -> pd.DataFrame:
     """
     Retrieves a historical streamflow simulation derived from a specified forcing for a certain reach_id
 
@@ -171,9 +187,12 @@ def historic_simulation(reach_id: int, return_format='csv', forcing='era_5',
         forcing: the runoff dataset used to drive the historic simulation (era_interim or era_5)
         endpoint: the endpoint of an api instance
         s: requests.Session instance connected to the api's root url
+        chunked: if True (csv only), stream the response and return an iterator of DataFrame chunks
+            instead of one large DataFrame, keeping peak memory at roughly one chunk
 
     Return Format:
         - return_format='csv' returns a pd.DataFrame()
+        - return_format='csv' with chunked=True returns an iterator of pd.DataFrame chunks
         - return_format='json' returns a json
         - return_format='waterml' returns a waterml string
         - return_format='url' returns a url string for using in a request or web browser
@@ -183,15 +202,8 @@ def historic_simulation(reach_id: int, return_format='csv', forcing='era_5',
 
             data = geoglows.streamflow.historic_simulation(12341234)
     """
-    method = 'HistoricSimulation/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}&forcing={forcing}'
-
-    # return the requested data
-    params = {'reach_id': reach_id, 'forcing': forcing, 'return_format': return_format}
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'HistoricSimulation/', {'reach_id': reach_id, 'forcing': forcing}, return_format,
+                          s, chunked)
 
 
 def daily_averages(reach_id: int, return_format='csv', forcing='era_5',
@@ -217,15 +229,7 @@ def daily_averages(reach_id: int, return_format='csv', forcing='era_5',
 
             data = geoglows.streamflow.seasonal_average(12341234)
     """
-    method = 'DailyAverages/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}&forcing={forcing}'
-
-    # return the requested data
-    params = {'reach_id': reach_id, 'forcing': forcing, 'return_format': return_format}
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'DailyAverages/', {'reach_id': reach_id, 'forcing': forcing}, return_format, s)
 
 
 def monthly_averages(reach_id: int, return_format='csv', forcing='era_5',
@@ -251,15 +255,7 @@ def monthly_averages(reach_id: int, return_format='csv', forcing='era_5',
 
             data = geoglows.streamflow.seasonal_average(12341234)
     """
-    method = 'MonthlyAverages/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}&forcing={forcing}'
-
-    # return the requested data
-    params = {'reach_id': reach_id, 'forcing': forcing, 'return_format': return_format}
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'MonthlyAverages/', {'reach_id': reach_id, 'forcing': forcing}, return_format, s)
 
 
 def return_periods(reach_id: int, return_format='csv', forcing='era_5',
@@ -285,16 +281,170 @@ def return_periods(reach_id: int, return_format='csv', forcing='era_5',
 
             data = geoglows.streamflow.return_periods(12341234)
     """
-    method = 'ReturnPeriods/'
+    return _endpoint_call(endpoint, 'ReturnPeriods/', {'reach_id': reach_id, 'forcing': forcing}, return_format, s)
 
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return f'{endpoint}{method}?reach_id={reach_id}&forcing={forcing}'
 
-    # return the requested data
-    params = {'reach_id': reach_id, 'forcing': forcing, 'return_format': return_format}
+# FUNCTIONS THAT MAKE MANY CONCURRENT CALLS TO THE API
+async def forecast_stats_async(reach_ids: list, return_format: str = 'csv', forecast_date: str = None,
+                               endpoint: str = ENDPOINT) -> list:
+    """
+    Retrieves forecast_stats for many reach_ids concurrently rather than one at a time
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forecast_date: a string specifying the date to request in YYYYMMDD format
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+
+    Example:
+        .. code-block:: python
+
+            data = asyncio.run(geoglows.streamflow.forecast_stats_async([12341234, 43214321]))
+    """
+    params_list = []
+    for reach_id in reach_ids:
+        params = {'reach_id': reach_id, 'return_format': return_format}
+        if forecast_date is not None:
+            params['date'] = forecast_date
+        params_list.append(params)
+    return await _gather_requests(endpoint, 'ForecastStats/', params_list, return_format)
+
+
+def forecast_stats_many(reach_ids: list, return_format: str = 'csv', forecast_date: str = None,
+                        endpoint: str = ENDPOINT) -> list:
+    """
+    Synchronous convenience wrapper which runs forecast_stats_async in a new event loop
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forecast_date: a string specifying the date to request in YYYYMMDD format
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+
+    Example:
+        .. code-block:: python
+
+            data = geoglows.streamflow.forecast_stats_many([12341234, 43214321])
+    """
+    return asyncio.run(_run_batch(forecast_stats_async(reach_ids, return_format, forecast_date, endpoint)))
+
+
+async def forecast_ensembles_async(reach_ids: list, return_format: str = 'csv', forecast_date: str = None,
+                                   endpoint: str = ENDPOINT) -> list:
+    """
+    Retrieves forecast_ensembles for many reach_ids concurrently rather than one at a time
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forecast_date: a string specifying the date to request in YYYYMMDD format
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+    """
+    params_list = []
+    for reach_id in reach_ids:
+        params = {'reach_id': reach_id, 'return_format': return_format}
+        if forecast_date is not None:
+            params['date'] = forecast_date
+        params_list.append(params)
+    return await _gather_requests(endpoint, 'ForecastEnsembles/', params_list, return_format)
+
+
+def forecast_ensembles_many(reach_ids: list, return_format: str = 'csv', forecast_date: str = None,
+                            endpoint: str = ENDPOINT) -> list:
+    """
+    Synchronous convenience wrapper which runs forecast_ensembles_async in a new event loop
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forecast_date: a string specifying the date to request in YYYYMMDD format
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+    """
+    return asyncio.run(_run_batch(forecast_ensembles_async(reach_ids, return_format, forecast_date, endpoint)))
+
+
+async def historic_simulation_async(reach_ids: list, return_format: str = 'csv', forcing: str = 'era_5',
+                                    endpoint: str = ENDPOINT) -> list:
+    """
+    Retrieves historic_simulation for many reach_ids concurrently rather than one at a time
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forcing: the runoff dataset used to drive the historic simulation (era_interim or era_5)
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+    """
+    params_list = [{'reach_id': reach_id, 'forcing': forcing, 'return_format': return_format}
+                   for reach_id in reach_ids]
+    return await _gather_requests(endpoint, 'HistoricSimulation/', params_list, return_format)
+
+
+def historic_simulation_many(reach_ids: list, return_format: str = 'csv', forcing: str = 'era_5',
+                             endpoint: str = ENDPOINT) -> list:
+    """
+    Synchronous convenience wrapper which runs historic_simulation_async in a new event loop
 
-    return _make_request(endpoint, method, params, return_format, s)
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forcing: the runoff dataset used to drive the historic simulation (era_interim or era_5)
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+    """
+    return asyncio.run(_run_batch(historic_simulation_async(reach_ids, return_format, forcing, endpoint)))
+
+
+async def return_periods_async(reach_ids: list, return_format: str = 'csv', forcing: str = 'era_5',
+                               endpoint: str = ENDPOINT) -> list:
+    """
+    Retrieves return_periods for many reach_ids concurrently rather than one at a time
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forcing: the runoff dataset used to drive the historic simulation (era_interim or era_5)
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+    """
+    params_list = [{'reach_id': reach_id, 'forcing': forcing, 'return_format': return_format}
+                   for reach_id in reach_ids]
+    return await _gather_requests(endpoint, 'ReturnPeriods/', params_list, return_format)
+
+
+def return_periods_many(reach_ids: list, return_format: str = 'csv', forcing: str = 'era_5',
+                        endpoint: str = ENDPOINT) -> list:
+    """
+    Synchronous convenience wrapper which runs return_periods_async in a new event loop
+
+    Args:
+        reach_ids: a list of stream IDs
+        return_format: 'csv', 'json', 'waterml'
+        forcing: the runoff dataset used to drive the historic simulation (era_interim or era_5)
+        endpoint: the endpoint of an api instance
+
+    Returns:
+        list of responses, one per reach_id, in the same order as the reach_ids
+    """
+    return asyncio.run(_run_batch(return_periods_async(reach_ids, return_format, forcing, endpoint)))
 
 
 def available_data(endpoint: str = ENDPOINT, return_format='json', s: requests.Session = False) -> dict or str:
@@ -315,14 +465,9 @@ def available_data(endpoint: str = ENDPOINT, return_format='json', s: requests.S
             data = geoglows.streamflow.available_data()
 
     """
-    method = 'AvailableData/'
-
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return endpoint + method
-
-    # return the requested data
-    return _make_request(endpoint, method, {}, return_format, s)
+    if return_format == 'json' and not s:
+        return _metadata_memo(endpoint, 'AvailableData/')
+    return _endpoint_call(endpoint, 'AvailableData/', {}, return_format, s)
 
 
 def available_regions(endpoint: str = ENDPOINT, return_format='json', s: requests.Session = False) -> dict or str:
@@ -343,13 +488,9 @@ def available_regions(endpoint: str = ENDPOINT, return_format='json', s: request
 
             data = geoglows.streamflow.available_regions(12341234)
     """
-    method = 'AvailableRegions/'
-
-    if return_format == 'url':
-        return endpoint + method
-
-    # return the requested data
-    return _make_request(endpoint, method, {}, return_format, s)
+    if return_format == 'json' and not s:
+        return _metadata_memo(endpoint, 'AvailableRegions/')
+    return _endpoint_call(endpoint, 'AvailableRegions/', {}, return_format, s)
 
 
 def available_dates(reach_id: int = None, region: str = None, return_format: str = 'json',
@@ -373,8 +514,6 @@ def available_dates(reach_id: int = None, region: str = None, return_format: str
 
             data = geoglows.streamflow.available_dates(12341234)
     """
-    method = 'AvailableDates/'
-
     # you need a region for the api call, so the user needs to provide one or a valid reach_id to get it from
     if region:
         params = {'region': region}
@@ -383,15 +522,85 @@ def available_dates(reach_id: int = None, region: str = None, return_format: str
     else:
         raise RuntimeError('specify a region or a reach_id')
 
-    # if you only wanted the url, quit here
-    if return_format == 'url':
-        return endpoint + method
-
-    # return the requested data
-    return _make_request(endpoint, method, params, return_format, s)
+    return _endpoint_call(endpoint, 'AvailableDates/', params, return_format, s)
 
 
 # UTILITY FUNCTIONS
+# Indonesia 1M's
+# ------australia 2M (currently 200k's)
+# Japan 3M's
+# East Asia 4M's
+# South Asia 5M's
+# ------middle_east 6M (currently 600k's)
+# Africa 7M's
+# Central Asia 8M's
+# South America 9M's
+# West Asia 10M's
+# -------central_america 11M (currently 900k's)
+# Europe 12M's
+# North America 13M's
+# region i contains the reach_ids smaller than _REGION_THRESHOLDS[i] (and at least the previous
+# threshold); the thresholds are sorted so the lookup is a bisection instead of a linear scan
+_REGION_THRESHOLDS = np.array([
+    # IMPROPERLY NUMBERED REGIONS
+    300000, 700000, 1000000,
+    # CORRECTLY NUMBERED REGIONS
+    2000000, 4000000, 5000000, 6000000, 8000000, 9000000, 10000000, 11000000, 13000000, 14000000])
+_REGION_NAMES = (
+    'australia-geoglows', 'middle_east-geoglows', 'central_america-geoglows',
+    'islands-geoglows', 'japan-geoglows', 'east_asia-geoglows', 'south_asia-geoglows',
+    'africa-geoglows', 'central_asia-geoglows', 'south_america-geoglows', 'west_asia-geoglows',
+    'europe-geoglows', 'north_america-geoglows')
+
+
+@lru_cache(maxsize=None)
+def _boundaries() -> dict:
+    # cached so the boundaries pickle only gets read and parsed from disk once per process
+    path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'geometry', 'boundaries.pickle'))
+    with open(path, 'rb') as f:
+        return json.loads(pickle.load(f))
+
+
+@lru_cache(maxsize=None)
+def _boundary_geometries() -> tuple:
+    # flatten the boundary features to parallel lists of region names and shapely geometries plus
+    # an ndarray of their bounding boxes (minx, miny, maxx, maxy) for vectorized prefiltering.
+    # the geometries are prepared so repeated contains tests reuse their internal index.
+    # shapely gets imported on first use so api-only workflows never pay for loading it
+    from shapely.geometry import shape
+    from shapely.prepared import prep
+
+    regions = []
+    geometries = []
+    bounds = []
+    for region, geojson in _boundaries().items():
+        for feature in geojson['features']:
+            geometry = shape(feature['geometry'])
+            regions.append(region)
+            bounds.append(geometry.bounds)
+            geometries.append(prep(geometry))
+    return regions, geometries, np.array(bounds)
+
+
+@lru_cache(maxsize=None)
+def _region_points(region: str) -> pd.DataFrame:
+    # cached so each multi-MB table of stream centroids only gets read from disk once per process.
+    # a parquet copy of the table, if one has been generated next to the shipped pickle, is
+    # columnar and compressed and loads noticeably faster than unpickling the whole dataframe
+    base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'geometry'))
+    parquet_path = os.path.join(base_path, f'{region}-comid_lat_lon_z.parquet')
+    if pa is not None and os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    return pd.read_pickle(os.path.join(base_path, f'{region}-comid_lat_lon_z.pickle'))
+
+
+@lru_cache(maxsize=None)
+def _region_kdtree(region: str):
+    # cached so the kd-tree over every stream centroid in a region only gets built once per process
+    from scipy.spatial import cKDTree
+    return cKDTree(_region_points(region)[['Lat', 'Lon']].to_numpy())
+
+
 def reach_to_region(reach_id: int) -> str:
     """
     returns the delineation region name corresponding to the range of numbers for a given reach_id.
@@ -406,44 +615,29 @@ def reach_to_region(reach_id: int) -> str:
     Example:
         region = geoglows.streamflow.reach_to_region(5000000)
     """
-    # Indonesia 1M's
-    # ------australia 2M (currently 200k's)
-    # Japan 3M's
-    # East Asia 4M's
-    # South Asia 5M's
-    # ------middle_east 6M (currently 600k's)
-    # Africa 7M's
-    # Central Asia 8M's
-    # South America 9M's
-    # West Asia 10M's
-    # -------central_america 11M (currently 900k's)
-    # Europe 12M's
-    # North America 13M's
-
-    if not isinstance(reach_id, int):
-        reach_id = int(reach_id)
-
-    lookup = OrderedDict([
-        # IMPROPERLY NUMBERED REGIONS
-        ('australia-geoglows', 300000),
-        ('middle_east-geoglows', 700000),
-        ('central_america-geoglows', 1000000),
-        # CORRECTLY NUMBERED REGIONS
-        ('islands-geoglows', 2000000),
-        ('japan-geoglows', 4000000),
-        ('east_asia-geoglows', 5000000),
-        ('south_asia-geoglows', 6000000),
-        ('africa-geoglows', 8000000),
-        ('central_asia-geoglows', 9000000),
-        ('south_america-geoglows', 10000000),
-        ('west_asia-geoglows', 11000000),
-        ('europe-geoglows', 13000000),
-        ('north_america-geoglows', 14000000)
-    ])
-    for region, threshold in lookup.items():
-        if reach_id < threshold:
-            return region
-    raise ValueError(f'{reach_id} not in the range of reach_ids for this model')
+    i = bisect.bisect_right(_REGION_THRESHOLDS, int(reach_id))
+    if i >= len(_REGION_NAMES):
+        raise ValueError(f'{reach_id} not in the range of reach_ids for this model')
+    return _REGION_NAMES[i]
+
+
+def reach_to_region_many(reach_ids) -> list:
+    """
+    Vectorized version of reach_to_region for associating many reach_ids with their regions at once
+
+    Args:
+        reach_ids: an iterable of stream IDs
+
+    Return:
+        list of region names, one per reach_id, in the same order as the reach_ids
+
+    Example:
+        regions = geoglows.streamflow.reach_to_region_many([5000000, 9004355])
+    """
+    indices = np.searchsorted(_REGION_THRESHOLDS, np.asarray(reach_ids, dtype=np.int64), side='right')
+    if np.any(indices >= len(_REGION_NAMES)):
+        raise ValueError('one or more reach_ids not in the range of reach_ids for this model')
+    return [_REGION_NAMES[i] for i in indices]
 
 
 def reach_to_latlon(reach_id: int, region: str = False) -> tuple:
@@ -460,8 +654,7 @@ def reach_to_latlon(reach_id: int, region: str = False) -> tuple:
     """
     if not region:
         region = reach_to_region(reach_id)
-    base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'geometry'))
-    df = pd.read_pickle(os.path.join(base_path, f'{region}-comid_lat_lon_z.pickle'))
+    df = _region_points(region)
     df = df[df.index == reach_id]
     if len(df.index) == 0:
         raise LookupError(f'The reach_id "{reach_id}" was not found in region "{region}"')
@@ -486,19 +679,10 @@ def latlon_to_reach(lat: float, lon: float) -> dict:
     # determine the region that the point is in
     region = latlon_to_region(lat, lon)
 
-    # switch the point because the csv's are lat/lon, backwards from what shapely expects (lon then lat)
-    point = Point(float(lat), float(lon))
-
-    # open the region csv
-    base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'geometry'))
-    df = pd.read_pickle(os.path.join(base_path, f'{region}-geoglows-comid_lat_lon_z.pickle'))
-    points_df = df.loc[:, "Lat":"Lon"].apply(Point, axis=1)
-
-    # determine which point is closest
-    multi_pt = MultiPoint(points_df.tolist())
-    nearest_pt = nearest_points(point, multi_pt)
-    reach_id = int(points_df[points_df == nearest_pt[1]].index[0])
-    distance = nearest_pt[0].distance(nearest_pt[1])
+    # query the cached kd-tree of the region's stream centroids for the closest stream
+    distance, index = _region_kdtree(f'{region}-geoglows').query((float(lat), float(lon)), k=1)
+    reach_id = int(_region_points(f'{region}-geoglows').index[index])
+    distance = float(distance)
 
     # if the nearest stream if more than .1 degrees away, you probably didn't find the right stream
     if distance > 0.11:
@@ -521,47 +705,200 @@ def latlon_to_region(lat: float, lon: float) -> str:
     if lat is False or lon is False:
         raise ValueError('provide a valid latitude and longitude to in order to find a region')
 
-    # open the bounding boxes csv, figure out which regions the point lies within
-    point = Point(float(lon), float(lat))
-    bounds_pickle = os.path.abspath(os.path.join(os.path.dirname(__file__), 'geometry', 'boundaries.pickle'))
-    with open(bounds_pickle, 'rb') as f:
-        region_bounds = json.loads(pickle.load(f))
-    for region in region_bounds:
-        for polygon in region_bounds[region]['features']:
-            if shape(polygon['geometry']).contains(point):
-                return region
+    # prefilter the cached region boundaries with a vectorized bounding box check, then confirm
+    # the few candidate polygons with an exact contains test
+    lat = float(lat)
+    lon = float(lon)
+    regions, geometries, bounds = _boundary_geometries()
+    candidates = np.nonzero((bounds[:, 0] <= lon) & (lon <= bounds[:, 2]) &
+                            (bounds[:, 1] <= lat) & (lat <= bounds[:, 3]))[0]
+    if candidates.size > 0:
+        from shapely.geometry import Point
+        point = Point(lon, lat)
+        for i in candidates:
+            if geometries[i].contains(point):
+                return regions[i]
     # if there weren't any regions, return that there was an error
     raise ValueError('This point is not within any of the supported delineation regions.')
 
 
-# API AUXILIARY FUNCTION
-def _make_request(endpoint: str, method: str, params: dict, return_format: str, s: requests.Session = False):
+# API AUXILIARY FUNCTIONS
+# slowly-changing csv responses whose parsed dataframes are worth memoizing within the process
+_MEMOIZED_METHODS = ('ReturnPeriods/', 'HistoricSimulation/', 'DailyAverages/', 'MonthlyAverages/')
+
+# the metadata endpoints return small, essentially static, lists so they get memoized with a ttl
+_METADATA_TTL = 86400
+_METADATA_MEMO = {}
+
+
+def _metadata_memo(endpoint: str, method: str) -> dict:
+    key = endpoint + method
+    hit = _METADATA_MEMO.get(key)
+    if hit is not None and time.time() - hit[0] < _METADATA_TTL:
+        return hit[1]
+    value = _endpoint_call(endpoint, method, {}, 'json')
+    _METADATA_MEMO[key] = (time.time(), value)
+    return value
+
+
+def _endpoint_call(endpoint: str, method: str, params: dict, return_format: str, s: requests.Session = False,
+                   chunked: bool = False):
+    # the body shared by all the public api wrappers. unset optional parameters get dropped
+    params = {key: value for key, value in params.items() if value is not None}
+
+    # if you only wanted the url, quit here
+    if return_format == 'url':
+        query = urlencode(params)
+        return f'{endpoint}{method}?{query}' if query else endpoint + method
+
+    # return the requested data
+    params['return_format'] = return_format
+    return _make_request(endpoint, method, params, return_format, s, chunked)
+
+
+def _make_request(endpoint: str, method: str, params: dict, return_format: str, s: requests.Session = False,
+                  chunked: bool = False):
     if return_format == 'request':
         params['return_format'] = 'csv'
 
-    # request the data from the API
-    if s:
-        data = s.get(endpoint + method, params=params)
-    else:
-        data = requests.get(endpoint + method, params=params)
+    # repeated calls for the slowly-changing datasets skip both the network and the parse
+    if not s and not chunked and return_format == 'csv' and method in _MEMOIZED_METHODS:
+        url = requests.Request('GET', endpoint + method, params=params).prepare().url
+        return _memoized_csv(url, method).copy()
+
+    # request the data from the API through the injected session or the shared pooled session.
+    # csv responses get streamed so the parser reads straight from the socket buffer instead of
+    # materializing the whole body as a python str first
+    session = s if s else _SESSION
+    stream = return_format == 'csv'
+    data = session.get(endpoint + method, params=params, timeout=(3.05, 60), stream=stream)
     if data.status_code != 200:
         raise RuntimeError('Recieved an error from the Streamflow REST API: ' + data.text)
 
+    if stream:
+        data.raw.decode_content = True
+        if chunked:
+            # hand the caller an iterator of chunks so the full frame never materializes at
+            # once. each chunk gets the same index handling as the non-chunked csv return
+            reader = pd.read_csv(data.raw, index_col=0, chunksize=100_000)
+            return (_postprocess_csv(chunk, method) for chunk in reader)
+        return _postprocess_csv(_read_csv(data.raw), method)
+    return _process_response(data.text, method, return_format)
+
+
+def _async_client():
+    # one long-lived client per event loop multiplexes that loop's requests over pooled
+    # (http/2 capable) connections instead of rebuilding the tcp/tls state for each batch.
+    # built lazily so importing geoglows does not require httpx unless the async api gets used
+    loop = asyncio.get_running_loop()
+    client = _ACLIENTS.get(loop)
+    if client is None:
+        import httpx
+        client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            timeout=30.0,
+        )
+        _ACLIENTS[loop] = client
+    return client
+
+
+async def aclose():
+    """
+    Closes the async client belonging to the current event loop. Only needed by long-running
+    services embedding the async functions which want to release the pooled connections cleanly.
+    """
+    client = _ACLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _amake_request(endpoint: str, method: str, params: dict, return_format: str):
+    resp = await _async_client().get(endpoint + method, params=params)
+    if resp.status_code != 200:
+        raise RuntimeError('Recieved an error from the Streamflow REST API: ' + resp.text)
+    if return_format == 'csv':
+        # parse the raw bytes so the decode happens inside the tokenizer, not as a str copy
+        return _postprocess_csv(_read_csv(resp.content), method)
+    return _process_response(resp.text, method, return_format)
+
+
+async def _gather_requests(endpoint: str, method: str, params_list: list, return_format: str) -> list:
+    return await asyncio.gather(
+        *[_amake_request(endpoint, method, params, return_format) for params in params_list])
+
+
+async def _run_batch(coroutine):
+    # the *_many wrappers each run in a fresh event loop via asyncio.run, so the loop's own
+    # client must be closed before that loop is torn down or its pooled sockets would be
+    # orphaned. clients on other loops are untouched
+    try:
+        return await coroutine
+    finally:
+        await aclose()
+
+
+@lru_cache(maxsize=256)
+def _memoized_csv(url: str, method: str) -> pd.DataFrame:
+    data = _SESSION.get(url, timeout=(3.05, 60), stream=True)
+    if data.status_code != 200:
+        raise RuntimeError('Recieved an error from the Streamflow REST API: ' + data.text)
+    data.raw.decode_content = True
+    return _postprocess_csv(_read_csv(data.raw), method)
+
+
+def _read_csv(source) -> pd.DataFrame:
+    # source is the response body (str or bytes) or a file-like object streaming it. bytes are
+    # preferred over text since the parser then decodes inline instead of after a full str copy
+    if pacsv is not None:
+        if isinstance(source, str):
+            source = pa.py_buffer(source.encode())
+        elif isinstance(source, bytes):
+            source = pa.py_buffer(source)
+        df = pacsv.read_csv(source).to_pandas()
+        return df.set_index(df.columns[0])
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    elif isinstance(source, str):
+        source = StringIO(source)
+    return pd.read_csv(source, index_col=0, engine='c', low_memory=False, cache_dates=True)
+
+
+def _seasonal_index(tmp: pd.DataFrame) -> pd.DataFrame:
+    tmp.index = pd.to_datetime(tmp.index + 1, format='%j').strftime('%b %d')
+    return tmp
+
+
+def _datetime_index(tmp: pd.DataFrame) -> pd.DataFrame:
+    tmp.index = pd.to_datetime(tmp.index)
+    return tmp
+
+
+# how each method's csv index gets finished after parsing: None keeps the index as parsed,
+# methods not listed here have a timestamp index
+_CSV_INDEX_HANDLERS = {
+    'ForecastWarnings/': None,
+    'ReturnPeriods/': None,
+    'DailyAverages/': None,
+    'MonthlyAverages/': None,
+    'SeasonalAverage/': _seasonal_index,
+}
+
+
+def _postprocess_csv(tmp: pd.DataFrame, method: str) -> pd.DataFrame:
+    if 'z' in tmp.columns:
+        del tmp['z']
+    handler = _CSV_INDEX_HANDLERS.get(method, _datetime_index)
+    return handler(tmp) if handler is not None else tmp
+
+
+def _process_response(text: str, method: str, return_format: str):
     # process the response from the API as appropriate to make the corresponding python object
     if return_format == 'csv':
-        tmp = pd.read_csv(StringIO(data.text), index_col=0)
-        if 'z' in tmp.columns:
-            del tmp['z']
-        if method in ('ForecastWarnings/', 'ReturnPeriods/', 'DailyAverages/', 'MonthlyAverages/'):
-            return tmp
-        if method == 'SeasonalAverage/':
-            tmp.index = pd.to_datetime(tmp.index + 1, format='%j').strftime('%b %d')
-            return tmp
-        tmp.index = pd.to_datetime(tmp.index)
-        return tmp
+        return _postprocess_csv(_read_csv(text), method)
     elif return_format == 'json':
-        return json.loads(data.text)
+        return json.loads(text)
     elif return_format == 'waterml':
-        return data.text
+        return text
     else:
         raise ValueError(f'Unsupported return format requested: {return_format}')
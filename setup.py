@@ -19,7 +19,7 @@ setup(
                       Source='https://github.com/BYU-Hydroinformatics/geoglows'),
     license='BSD 3-Clause',
     license_family='BSD',
-    package_data={'': ['*.ipynb', '*.html']},
+    package_data={'': ['*.ipynb', '*.html', '*.parquet']},
     include_package_data=True,
     classifiers=[
         'Development Status :: 4 - Beta',
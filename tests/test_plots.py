@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import geoglows.plots
+
+
+def _synthetic_ensembles(timesteps: int = 8) -> pd.DataFrame:
+    # mimics the forecast_ensembles csv: 52 members sharing a datetime index
+    index = pd.date_range('2020-01-01', periods=timesteps, freq='3H')
+    data = {f'ensemble_{i:02}_m^3/s': np.random.rand(timesteps) for i in range(1, 53)}
+    return pd.DataFrame(data, index=index)
+
+
+def test_ensemble_members_are_c_contiguous():
+    # the per-member arrays are row views of one matrix and must stay C-contiguous or the
+    # orjson fast path in json_bytes refuses them
+    plot_data = geoglows.plots.forecast_ensembles(_synthetic_ensembles(), outformat='json')
+    for i in range(1, 52):
+        assert plot_data[f'ensemble_{i:02}_m^3/s'].flags['C_CONTIGUOUS']
+
+
+def test_forecast_ensembles_json_bytes_with_orjson():
+    pytest.importorskip('orjson')
+    payload = geoglows.plots.forecast_ensembles(_synthetic_ensembles(), outformat='json_bytes')
+    assert isinstance(payload, bytes)
+    assert payload